@@ -5,5 +5,9 @@ author: Chris Brasnett, University of Bristol, christopher.brasnett@bristol.ac.u
 
 """
 
-from .finder import finder
-from .phase_ID import main
\ No newline at end of file
+from .finder import finder, load
+from .phase_ID import main
+from .quality_control import check as quality_check
+from .instruments import profile, rebin
+from .similarity import fingerprint, similar
+from .refinement import two_pass
\ No newline at end of file
@@ -15,6 +15,23 @@ def without_invalid(d):
     keys = {'unassigned_peaks'}
     return {x: d[x] for x in d if x not in keys}
 
+def write_metrics(f,metrics):
+    f.write('quality control\t')
+    for key in metrics.keys():
+        f.write('%s: %f\t' %(key,metrics[key]))
+    f.write('\n')
+
+def write_phase(f,phase):
+    for key in phase.keys():                
+        f.write('%s\t' %key)
+        for j in phase[key]:
+            if type(j)==np.ndarray:
+                for k in j:
+                    f.write('%f\t' %k)
+            else:
+                f.write('%f\t' %j)
+        f.write('\n')
+
 '''
 begin editable section
 '''
@@ -50,11 +67,26 @@ text_save_dir= 'path/here'
 in_IDE_plots=True
 
 #which instrument was the data measured on? Give 'Ganesha' or 'DLS' (in quotes) for Ganesha or Diamond respectively.
+#to use another instrument, add a profile for it to instruments.py and give its name here.
 instrument='Ganesha'
 
 #if you can see peaks that aren't being picked up, try changing this value arouond a bit. THe defaults are 0.1 for Diamond data and 0.0001 for Ganesha
 peak_heights = None
 
+#quality control thresholds. Frames which don't reach these are skipped before looking for peaks in them, see quality_control.py.
+#if frames which obviously have peaks in them are being skipped, lower these values. The intensity threshold depends on the units of your data.
+qc_min_intensity=0
+qc_min_snr=5
+qc_min_peakiness=5
+
+#frames which are the same as the last fully analysed frame to within this reduced chi-square reuse its peaks and phases
+#instead of being analysed again, see similarity.py. Set to None to analyse every frame.
+duplicate_tolerance=1.5
+
+#find the peaks in two passes: a quick coarse scan to identify the phase, and then fits targeted at the peaks that phase should have,
+#with a refinement of the lattice parameter. True if yes, False to use the full peak finder. See refinement.py.
+two_pass=False
+
 '''
 end editable section
 '''
@@ -64,13 +96,8 @@ import lipidsaxs
 
 files=glob.glob(data_folder+'*'+file_extensions)
 
-if instrument=='Ganesha':
-    instrument_switch_Ganesha=True
-    instrument_switch_DLS=False
-elif instrument=='DLS':
-    instrument_switch_Ganesha=False
-    instrument_switch_DLS=True
-else:
+instrument_profile=lipidsaxs.profile(instrument,ht_threshold=peak_heights)
+if instrument_profile is None:
     print('Instrument variable has not been set correctly!')
 
 #this should find the correct code for the file. It splits the first file name by the directory folder, takes the last split, and then uses the code.
@@ -79,16 +106,59 @@ splitting = files[0].split(data_folder[:-1])[-1][1:-4]
 
 print("\rThe numbering of the files will be saved as %s onwards. If this doesn't make sense, stop the programme now, and consider how to use the splitting variable!" %splitting)
 
+#the last frame to be fully analysed, which the following frames are compared against
+reference=None
+
 p=1
 for i in files[5:]:
     print('Progress: %d/%d' %(p,len(files)))
-    peaks,saxs_data_x,saxs_data_y=lipidsaxs.finder(i,low_q,high_q,Ganesha=instrument_switch_Ganesha,DLS=instrument_switch_DLS,plot=in_IDE_plots,savefig=save_figures,savedir=fig_save_dir,ht_thresh=peak_heights)
+    name=i.split(data_folder[:-1])[-1][1:-4]
+    
+    #check that there is something in the frame worth looking for peaks in before doing any fitting
+    #this is done on the data rebinned to the resolution of the instrument, the same as the peak finder uses
+    qc_x,qc_y=lipidsaxs.load(i,low_q,high_q,skip_header=instrument_profile['skip_header'],delimiter=instrument_profile['delimiter'])
+    qc_x,qc_y=lipidsaxs.rebin(qc_x,qc_y,instrument_profile['q_resolution'])
+    passed,reason,qc_metrics=lipidsaxs.quality_check(qc_x,qc_y,min_intensity=qc_min_intensity,min_snr=qc_min_snr,min_peakiness=qc_min_peakiness)
+    if not passed:
+        print('Skipping %s: %s' %(name,reason))
+        with open(text_save_dir+'/output.txt', 'a') as f:
+            f.write(name+':\n')
+            f.write('skipped by quality control: %s\n' %reason)
+            write_metrics(f,qc_metrics)
+            f.write('\n')
+        p=p+1
+        continue
+    
+    #if nothing has changed since the last frame that was analysed, reuse what was found in it
+    frame_print=lipidsaxs.fingerprint(qc_x,qc_y,low_q,high_q)
+    if duplicate_tolerance is not None and reference is not None and lipidsaxs.similar(frame_print,reference['fingerprint'],tolerance=duplicate_tolerance):
+        print('%s is the same as %s, reusing its results' %(name,reference['name']))
+        with open(text_save_dir+'/output.txt', 'a') as f:
+            f.write(name+':\n')
+            write_metrics(f,qc_metrics)
+            f.write('inherited from %s\n' %reference['name'])
+            if reference['found']==True:
+                write_phase(f,reference['phase'])
+            else:
+                f.write('no peaks found\n')
+            f.write('\n')
+        p=p+1
+        continue
+    
+    phase={}
+    if two_pass==True:
+        found=lipidsaxs.two_pass(i,low_q,high_q,instrument=instrument_profile)
+        if type(found)!=int:
+            phase,saxs_data_x,saxs_data_y=found
+    else:
+        found=lipidsaxs.finder(i,low_q,high_q,instrument=instrument_profile,plot=in_IDE_plots,savefig=save_figures,savedir=fig_save_dir)
+        if type(found)!=int:
+            peaks,saxs_data_x,saxs_data_y=found
+            phase=lipidsaxs.main(peaks,low_q)
     
     #change ordering here so that every file title is written, then phase is tested, then write phase info to file
     #if no phase info, then write 'none' or something
-    if type(peaks)!=int:
-        phase=lipidsaxs.main(peaks,low_q)
-        
+    if type(found)!=int:
         #plot the data
         if in_IDE_plots==True:
             #exclude unassigned peaks from plot
@@ -105,28 +175,22 @@ for i in files[5:]:
             plt.xlabel('$q$ (Å$^{-1}$)')
             plt.ylabel('Intensity (A.U.)')
             if save_figures==True:
-                name=i.split('\\')[-1][:-4]
-                plt.savefig(fig_save_dir+'/'+name+'_phases.png',dpi=200)
+                fig_name=i.split('\\')[-1][:-4]
+                plt.savefig(fig_save_dir+'/'+fig_name+'_phases.png',dpi=200)
             plt.show()
             plt.clf()
         
         with open(text_save_dir+'/output.txt', 'a') as f:
-            name=i.split(data_folder[:-1])[-1][1:-4]
             f.write(name+':\n')
-            for key in phase.keys():                
-                f.write('%s\t' %key)
-                for j in phase[key]:
-                    if type(j)==np.ndarray:
-                        for k in j:
-                            f.write('%f\t' %k)
-                    else:
-                        f.write('%f\t' %j)
-                f.write('\n')
+            write_metrics(f,qc_metrics)
+            write_phase(f,phase)
             f.write('\n')
-    elif type(peaks)==int:
+    elif type(found)==int:
         with open(text_save_dir+'/output.txt', 'a') as f:
-            name=i.split(data_folder[:-1])[-1][1:-4]
             f.write(name+':\n')
+            write_metrics(f,qc_metrics)
             f.write('no peaks found')
             f.write('\n')            
+    
+    reference={'name':name,'fingerprint':frame_print,'found':type(found)!=int,'phase':phase}
     p=p+1
\ No newline at end of file
@@ -8,8 +8,9 @@ author: Chris Brasnett, University of Bristol, christopher.brasnett@bristol.ac.u
 It works by fitting a convolution of a Voigt peak and a linear background to a continous window of data throughout a given q range.
 Refinement then happens to clarify the true positions of peaks in the
 
-NB: The fitting range is hard-coded as a 15 point window in the discretised data, so care 
-should be taken with regards to this fact if you are fitting data with much broader peaks. The programme will then remove peaks
+NB: The fitting range is set as a window in q by the profile of the instrument (see instruments.py), and the data is first
+averaged down onto a grid matched to the resolution of the instrument, so care should be taken with regards to this fact if
+you are fitting data with much broader peaks. The programme will then remove peaks
 which have been found multiple times by the inital search. If a figure of the q vs. I(q) data overlaid with lines where the 
 peaks have been fitted to in q is wanted, this can then be displayed if wanted - defined by one of the programme parameters.
 
@@ -25,6 +26,9 @@ pass the following parameters to this function:
     
     Ganesha, DLS - optional in name, but not in practice. Where the data was taken (in house or at Diamond) will affect how some of 
                     the refinement routines behave. See the extended documentation for more details.
+    
+    instrument - the name of an instrument profile in instruments.py, or a dictionary laid out in the same way. Can be used 
+                 instead of the Ganesha and DLS switches.
      
     fig - optional, set as True if you want to see a figure of the peaks found overlaid on the data passed to the function.
 """
@@ -33,6 +37,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import lmfit as lm
 import os 
+from .instruments import profile, rebin
 
 def fitting(x,y,approx_centre,height_threshold,fitplot=False):
     #fit the peak using a convolution of an exponential function and a Voigt peak
@@ -82,101 +87,116 @@ def fitting(x,y,approx_centre,height_threshold,fitplot=False):
         return fitted_centre,sigma,height
     else: return 0
 
-def b(Ganesha=False,DLS=False,plot=False,**kwargs):
-    if Ganesha==True:
-        #delim_str=','
-        ht_threshold=0.0001
-        
-    elif DLS==True:
-        #delim_str='\t'
-        ht_threshold=0.1
+"""
+load reads the I(q) vs q data from a file and cuts out the x and y data defined by the q range. It is used by the finder,
+and can be used to get the same data for anything that needs to look at the pattern before (or instead of) peak finding.
+
+pass the following parameters to this function:
+    file_name - the full file path to the I vs q data. Must be formatted q in first (0) column, I(q) in second (1) column
     
-    try:
-        ht_threshold = kwargs['ht_threshold']
-        return ht_threshold#,delim_str
+    lower_limit, upper_limit - the low and high limits of the q range to return.
     
-    except KeyError:
-        return ht_threshold#,delim_str
-        pass
+    skip_header, delimiter - the format of the file, passed to np.genfromtxt. See the instrument profiles in instruments.py.
+"""
+def load(file_name,lower_limit,upper_limit,skip_header=10,delimiter=None):
+    table=np.genfromtxt(file_name,skip_header=skip_header,delimiter=delimiter)
+    
+    #cut out the x and y data defined by the q range.
+    in_range=np.intersect1d(np.where(table[0:,0]>lower_limit),np.where(table[0:,0]<upper_limit))
+    x_data=table[in_range,0]
+    y_data=table[in_range,1]
+    return x_data,y_data
 
-def a(G_flag=False,DLS_flag=False,ht_value=None):
-    if ht_value is None:
-        t = b(Ganesha = G_flag,DLS = DLS_flag)
-    else:
-        k={'ht_threshold':ht_value}
-        t= b(Ganesha = G_flag,DLS = DLS_flag, **k)
-    return t
-        
+"""
+scan fits a moving window across the data to find the peaks in it, and then removes the peaks which have been found multiple
+times over, returning an array of the peaks found. It is used by the finder, and can be used to look for peaks in data which 
+has already been loaded.
 
-def finder(file_name,lower_limit,upper_limit, Ganesha=False,DLS=False,plot=False,savefig=False,savedir=os.path.dirname(os.path.realpath(__file__)),ht_thresh=None):
+pass the following parameters to this function:
+    x_data, y_data - the q and I(q) values of the data to look for peaks in.
     
-    pars = a(G_flag = Ganesha, DLS_flag = DLS,ht_value = ht_thresh)
-    ht_threshold=pars
+    fitting_range - the number of data points in each window fit.
     
-    try:
-        #get the data from the file
-        table=np.genfromtxt(file_name,skip_header=10)
+    ht_threshold - the height below which a fitted peak is considered to be noise.
+"""
+def scan(x_data,y_data,fitting_range,ht_threshold):
+    #attempt to fit the data across a moving window of the q range of interest. This will find peaks multiple times over.
+    peaks=np.zeros(0)
+    for i in range(0,len(x_data)-1-fitting_range):
+        x=x_data[i:(i+fitting_range)]
+        y=y_data[i:(i+fitting_range)]
         
-        #cut out the x and y data defined by the q range.
-        x_data=table[np.intersect1d(np.where(table[0:,0]>lower_limit),np.where(table[0:,0]<upper_limit)),0]
-        y_data=table[np.intersect1d(np.where(table[0:,0]>lower_limit),np.where(table[0:,0]<upper_limit)),1]
-    
-        #the number of data points to trial fits across
-        fitting_range=10
+        result=fitting(x,y,np.mean(x),height_threshold=ht_threshold)
         
-        #attempt to fit the data across a moving window of the q range of interest. This will find peaks multiple times over.
-        peaks=np.zeros(0)
-        for i in range(0,(np.where(table[0:,0]<upper_limit)[-1][-1]-np.where(table[0:,0]>lower_limit)[0][0]-fitting_range)):
-            x=x_data[i:(i+fitting_range)]
-            y=y_data[i:(i+fitting_range)]
-            
-            result=fitting(x,y,np.mean(x),height_threshold=ht_threshold)
+        if result != 0:
+            peaks=np.append(peaks, result[0])
+    
+    if len(peaks)==0:
+        return peaks
+    
+    #define the minimum separation between peaks - otherwise the binning of the data will put separate peaks into one bin.
+    #bin the peaks found during the fitting procedure
+    #assume that an isolated peak is just fitted noise
+
+    hist, bin_edges=np.histogram(peaks,bins=np.arange(min(peaks), max(peaks) + 0.005, 0.005))
+    inds=np.digitize(peaks,bin_edges)
+    
+    returning_peaks=np.zeros(0)
+    for i in range(0, np.size(np.arange(min(peaks), max(peaks) + 0.005, 0.005))):
+        try:
+            #look forwards and backward to catch each bin incase the values have leaked between boundaries
+            previous_bin=peaks[np.where(inds==(i-1))]
+            this_bin=peaks[np.where(inds==i)]
+            next_bin=peaks[np.where(inds==(i+1))]
             
-            if result != 0:
-                peaks=np.append(peaks, result[0])
-        
-        #define the minimum separation between peaks - otherwise the binning of the data will put separate peaks into one bin.
-        #bin the peaks found during the fitting procedure
-        #assume that an isolated peak is just fitted noise
+            #if two bins are next to each other, group them together and average those values to return
+            if len(this_bin)>0 and len(previous_bin)>0 and len(next_bin)==0:
+                conc_bin=np.concatenate((this_bin,previous_bin))
+                returning_peaks=np.append(returning_peaks,np.mean(conc_bin))
+                
+            #otherwise just average the bin and return it as the peak.
+            elif len(this_bin)>0 and len(previous_bin)==0 and len(next_bin)==0:
+                returning_peaks=np.append(returning_peaks,np.mean(this_bin))
 
-        hist, bin_edges=np.histogram(peaks,bins=np.arange(min(peaks), max(peaks) + 0.005, 0.005))
-        inds=np.digitize(peaks,bin_edges)
+        except IndexError:
+            pass
         
-        returning_peaks=np.zeros(0)
-        for i in range(0, np.size(np.arange(min(peaks), max(peaks) + 0.005, 0.005))):
-            try:
-                #look forwards and backward to catch each bin incase the values have leaked between boundaries
-                previous_bin=peaks[np.where(inds==(i-1))]
-                this_bin=peaks[np.where(inds==i)]
-                next_bin=peaks[np.where(inds==(i+1))]
-                
-                #if two bins are next to each other, group them together and average those values to return
-                if len(this_bin)>0 and len(previous_bin)>0 and len(next_bin)==0:
-                    conc_bin=np.concatenate((this_bin,previous_bin))
-                    returning_peaks=np.append(returning_peaks,np.mean(conc_bin))
-                    
-                #otherwise just average the bin and return it as the peak.
-                elif len(this_bin)>0 and len(previous_bin)==0 and len(next_bin)==0:
-                    returning_peaks=np.append(returning_peaks,np.mean(this_bin))
-
-            except IndexError:
-                pass
-            
-        if plot==True:
-            plt.plot(x_data,y_data)
-            for i in returning_peaks:
-                plt.axvline(i,c='r')
-            plt.xlabel('$q$ (Å$^{-1}$)')
-            plt.ylabel('Intensity (A.U.)')
-            if savefig==True:
-                name=file_name.split('\\')[-1][:-4]
-                plt.savefig(savedir+'/'+name+'.png',dpi=200)
-            plt.show()
-            plt.clf()
+    return returning_peaks
 
-        if len(returning_peaks)>0:
-            return returning_peaks, x_data, y_data
-        else:
-            return 0
-    except UnboundLocalError:
+def finder(file_name,lower_limit,upper_limit, Ganesha=False,DLS=False,plot=False,savefig=False,savedir=os.path.dirname(os.path.realpath(__file__)),ht_thresh=None,instrument=None):
+    
+    pars = profile(instrument,Ganesha=Ganesha,DLS=DLS,ht_threshold=ht_thresh)
+    if pars is None:
         print('Error! You must tell the programme where the data was collected in order to use the peak finder.')
+        return
+    ht_threshold=pars['ht_threshold']
+    
+    #get the data from the file, cut to the q range of interest
+    x_data,y_data=load(file_name,lower_limit,upper_limit,skip_header=pars['skip_header'],delimiter=pars['delimiter'])
+    
+    #average oversampled data down onto a grid matched to the resolution of the instrument
+    x_data,y_data=rebin(x_data,y_data,pars['q_resolution'])
+
+    #the number of data points to trial fits across: the width of the window in q, in points of the (rebinned) data.
+    #the Voigt and linear background have 5 free parameters between them, and a window with not many more points than that
+    #will fit the noise, so never use fewer points than the 10 that used to be used for every window.
+    fitting_range=max(int(round(pars['window_width']/np.median(np.diff(x_data)))),10)
+    
+    returning_peaks=scan(x_data,y_data,fitting_range,ht_threshold)
+        
+    if plot==True:
+        plt.plot(x_data,y_data)
+        for i in returning_peaks:
+            plt.axvline(i,c='r')
+        plt.xlabel('$q$ (Å$^{-1}$)')
+        plt.ylabel('Intensity (A.U.)')
+        if savefig==True:
+            name=file_name.split('\\')[-1][:-4]
+            plt.savefig(savedir+'/'+name+'.png',dpi=200)
+        plt.show()
+        plt.clf()
+
+    if len(returning_peaks)>0:
+        return returning_peaks, x_data, y_data
+    else:
+        return 0
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Chris Brasnett, University of Bristol, christopher.brasnett@bristol.ac.uk
+
+This programme holds the profiles of the instruments that data is taken on, which set how the peak finder behaves for data
+from each instrument. A profile is just a dictionary, with the following keys:
+
+    ht_threshold - the height below which a fitted peak is considered to be noise. See finder.py.
+
+    q_resolution - the spacing in q (Å^-1) of the grid that the data is rebinned onto before looking for peaks in it. This
+                   should be matched to the instrumental resolution: data which is sampled more finely than this is averaged
+                   down onto the grid, and data which is sampled more coarsely is left as it is. None turns the rebinning off.
+
+    window_width - the width in q (Å^-1) of the window that is fitted across the data when looking for peaks. Together with
+                   the q_resolution, this sets the number of points in each window fit, and so the number of fits done for
+                   each pattern depends on the physics rather than how finely the detector happens to be binned.
+
+    skip_header, delimiter - the format of the data files: the number of header lines to skip, and the delimiter between the
+                             columns (None for any whitespace). These are passed to np.genfromtxt.
+
+To use data from another instrument, add a profile to the profiles dictionary below, or pass a dictionary with the same keys
+to the finder as the instrument.
+"""
+
+import numpy as np
+
+profiles={
+    'Ganesha':{'ht_threshold':0.0001,
+               'q_resolution':0.001,
+               'window_width':0.01,
+               'skip_header':10,
+               'delimiter':None},
+    'DLS':{'ht_threshold':0.1,
+           'q_resolution':0.0005,
+           'window_width':0.005,
+           'skip_header':10,
+           'delimiter':None},
+    }
+
+"""
+profile returns a copy of the profile of an instrument, with any values passed as keywords replacing those in the profile.
+If no profile can be found for the instrument given, None is returned.
+
+pass the following parameters to this function:
+    instrument - the name of an instrument in the profiles dictionary, or a dictionary laid out like the profiles above.
+
+    Ganesha, DLS - the older way of saying where the data was taken, kept so that the finder can still be called with them.
+
+    any of the keys of a profile can also be passed to override the value in the profile, eg. ht_threshold=0.01. Values of
+    None are ignored, so that optional arguments can be passed straight through.
+"""
+def profile(instrument=None,Ganesha=False,DLS=False,**kwargs):
+    if instrument is None:
+        if Ganesha==True:
+            instrument='Ganesha'
+        elif DLS==True:
+            instrument='DLS'
+
+    if isinstance(instrument,dict):
+        prof=dict(instrument)
+    elif instrument in profiles:
+        prof=dict(profiles[instrument])
+    else:
+        return None
+
+    for key in kwargs.keys():
+        if kwargs[key] is not None:
+            prof[key]=kwargs[key]
+    return prof
+
+"""
+rebin averages I(q) vs q data down onto a uniform grid in q with a spacing of q_resolution. The q value of each new point is
+the mean of the q values averaged into it, so that peak positions are not shifted at the edges of the data. Data which is
+already sampled at least as coarsely as q_resolution is returned as it is.
+
+pass the following parameters to this function:
+    x, y - the q and I(q) values of the data.
+
+    q_resolution - the spacing of the grid to rebin onto.
+"""
+def rebin(x,y,q_resolution):
+    if q_resolution is None or len(x)<2 or np.median(np.diff(x))>=q_resolution:
+        return x,y
+
+    edges=np.arange(np.min(x),np.max(x)+q_resolution,q_resolution)
+    counts=np.histogram(x,bins=edges)[0]
+    x_sums=np.histogram(x,bins=edges,weights=x)[0]
+    y_sums=np.histogram(x,bins=edges,weights=y)[0]
+
+    filled=counts>0
+    return x_sums[filled]/counts[filled],y_sums[filled]/counts[filled]
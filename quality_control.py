@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Chris Brasnett, University of Bristol, christopher.brasnett@bristol.ac.uk
+
+This programme is a quick quality control gate to be run on I(q) vs q data before it is passed to the peak finder. A lot of
+frames in a typical dataset have no mesophase in them at all (empty capillaries, air shots, frames with the beam off, isotropic
+or micellar samples), and the window scan in finder.py will still try a full set of fits across every one of them before
+coming back with nothing. The metrics calculated here are cheap by comparison, and are calculated for every frame at once
+when a 2D array of frames (one frame per row, on the same q grid) is passed in.
+
+The metrics are:
+    intensity - the integrated intensity of the frame over the q range passed. Frames taken with no beam or with nothing in
+                the beam will be close to zero.
+
+    snr       - a contrast/signal to noise measure: the frame is smoothed over a narrow and a wide window in q, and the
+                residual (the narrow smoothing minus the wide one) picks out anything peak shaped sat on top of the
+                background. The snr is the height of the strongest feature in the residual above the median of the residual,
+                in units of the point to point noise of the frame. Measuring this on the residual rather than on I(q) stops
+                the low q end of the pattern, which is nearly always the most intense part, from counting as a feature.
+
+    peakiness - the largest value of the residual in units of the local noise of the residual. SAXS data is usually much
+                noisier at one end of the q range than the other, so using the local noise stops the noise at the noisy end
+                from being mistaken for peaks. Featureless and isotropic patterns have only broad features, and so a low
+                peakiness.
+
+The noise is estimated from the absolute differences between neighbouring points, which are not thrown off by the background
+in the way that a standard deviation would be. The ends of the residual, where the wide smoothing runs off the end of the
+data, are left out: a decaying pattern would otherwise have a fake peak at its low q end.
+
+The smoothing windows are set in q, so the metrics don't depend on how finely the detector samples q. They are meant to be
+run on data that has been rebinned to the resolution of the instrument (see instruments.py), the same as the finder uses.
+
+NB: the thresholds are somewhat arbitrary, and will depend on the instrument and exposure time. The intensity threshold in
+particular depends on the units of the data, so it is off (zero) by default. If frames that obviously have peaks in them are
+being rejected, try lowering the thresholds.
+"""
+
+import numpy as np
+
+"""
+_smooth is a moving average along the last axis of an array, with the ends of the array reflected so that the smoothed array
+is the same length as the one passed in.
+"""
+def _smooth(y,width):
+    half=width//2
+    padding=[(0,0)]*(np.ndim(y)-1)+[(half,half)]
+    padded=np.pad(y,padding,mode='reflect')
+
+    summed=np.cumsum(padded,axis=-1)
+    summed=np.concatenate((np.zeros(np.shape(summed)[:-1]+(1,)),summed),axis=-1)
+    return (summed[...,width:]-summed[...,:-width])/width
+
+"""
+noise estimates the point to point noise of each frame, as the scaled median absolute difference between neighbouring points.
+"""
+def noise(y):
+    return 1.4826*np.median(np.abs(np.diff(y,axis=-1)),axis=-1)/np.sqrt(2)
+
+"""
+local_noise estimates the noise around each point of each frame, from the mean absolute second difference of the points
+over a window of width points (for random noise this is 2*sqrt(3/pi) times the noise). Second differences are used so that
+the steep slope at the low q end of a pattern isn't counted as noise. This is used to put errors on the fingerprints in
+similarity.py, where the noise across the whole q range matters rather than just its typical value.
+"""
+def local_noise(y,width):
+    differences=np.abs(np.diff(y,n=2,axis=-1))
+    differences=np.concatenate((differences[...,:1],differences,differences[...,-1:]),axis=-1)
+    return _smooth(differences,width)*np.sqrt(np.pi/3)/2
+
+"""
+metrics calculates the quality control metrics for one or more frames, and returns them as a dictionary keyed by the metric
+name. If a single frame is passed, the values in the dictionary are single numbers, otherwise they are arrays with one value
+per frame.
+
+pass the following parameters to this function:
+    x - the q values of the data. If several frames are passed, they must share the same q values.
+
+    y - the I(q) values of the data: either a single frame, or a 2D array with one frame per row.
+
+    narrow, wide - the width in q (Å^-1) to smooth over when calculating the residual. narrow should be about the width of
+                   a Bragg peak, and wide should be several times wider than one.
+"""
+def metrics(x,y,narrow=0.003,wide=0.025):
+    frames=np.atleast_2d(y)
+    points=np.shape(frames)[-1]
+    step=np.median(np.diff(x))
+
+    #convert the smoothing windows to points, and make sure that they are odd and leave something of the frame once the
+    #ends have been left out
+    wide=min(int(round(wide/step)),(points-1)//2)
+    wide=max(wide-(1-wide%2),3)
+    narrow=min(max(int(round(narrow/step)),1),wide-2)
+    narrow=narrow-(1-narrow%2)
+    half=wide//2
+
+    sigma=noise(frames)
+    #local point to point noise, from the mean absolute difference between neighbouring points (2/sqrt(pi) times the noise)
+    differences=np.abs(np.diff(frames,axis=-1))
+    differences=np.concatenate((differences,differences[...,-1:]),axis=-1)
+    local_sigma=_smooth(differences,wide)*np.sqrt(np.pi)/2
+    #the noise on the difference of the two smoothings
+    local_sigma=local_sigma*np.sqrt(1/narrow-1/wide)
+
+    #stop the division blowing up for frames that are totally flat (eg. with the beam off)
+    tiny=np.finfo(float).tiny
+    sigma=np.where(sigma>0,sigma,tiny)
+    local_sigma=np.where(local_sigma>0,local_sigma,tiny)
+
+    residual=(_smooth(frames,narrow)-_smooth(frames,wide))[...,half:points-half]
+    local_sigma=local_sigma[...,half:points-half]
+
+    intensity=np.sum((frames[...,1:]+frames[...,:-1])/2*np.diff(x),axis=-1)
+    snr=(np.max(residual,axis=-1)-np.median(residual,axis=-1))/sigma
+    peakiness=np.max(residual/local_sigma,axis=-1)
+
+    values={'intensity':intensity,'snr':snr,'peakiness':peakiness}
+    if np.ndim(y)==1:
+        values={key:values[key][0] for key in values}
+    return values
+
+"""
+check runs the quality control gate on one or more frames, and says which of the frames are worth passing on to the peak
+finder. It returns whether each frame passed, the reason each frame failed (an empty string for those that passed) and the
+metrics that were calculated, so that they can be reported along with the results.
+
+pass the following parameters to this function:
+    x, y - as for metrics
+
+    min_intensity - the lowest integrated intensity a frame can have to be passed on. Off by default, see note at the top.
+
+    min_snr - the lowest signal to noise a frame can have to be passed on.
+
+    min_peakiness - the lowest peakiness a frame can have to be passed on.
+"""
+def check(x,y,min_intensity=0,min_snr=5,min_peakiness=5):
+    values=metrics(x,y)
+
+    intensity=np.atleast_1d(values['intensity'])
+    snr=np.atleast_1d(values['snr'])
+    peakiness=np.atleast_1d(values['peakiness'])
+
+    passed=np.ones(np.size(intensity),dtype=bool)
+    reasons=['']*np.size(intensity)
+
+    #work through the tests from the cheapest explanation to the most subtle, and only give the first reason for failing
+    tests=[(intensity<=min_intensity,'integrated intensity %g is not above %g',intensity,min_intensity),
+           (snr<min_snr,'signal to noise %.1f is below %g',snr,min_snr),
+           (peakiness<min_peakiness,'peakiness %.1f is below %g',peakiness,min_peakiness)]
+    for failed,message,value,threshold in tests:
+        for i in np.where(failed&passed)[0]:
+            reasons[i]=message %(value[i],threshold)
+        passed=passed&~failed
+
+    if np.ndim(y)==1:
+        return passed[0],reasons[0],values
+    return passed,reasons,values
@@ -0,0 +1,234 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Chris Brasnett, University of Bristol, christopher.brasnett@bristol.ac.uk
+
+This programme finds and identifies the peaks in I(q) vs q data in two passes, rather than running the full window scan of
+finder.py across the whole pattern before anything is known about the phase:
+
+    1) the coarse pass averages the data down onto a grid a few times coarser than the resolution of the instrument, runs
+       the window scan across it to find the strong peaks, and passes these to phase_ID.py to get a provisional phase and
+       lattice parameter.
+
+    2) the targeted pass projects the reflections of each phase found from its fundamental (sqrt(ratios)*fundamental, as in
+       Q_projection_testing in phase_ID.py), and fits the data at the resolution of the instrument only in a narrow window
+       around each of the projected peaks. As the fits are held to the projected positions, they can use a lower height
+       threshold than the scan, which picks up the weaker, higher order reflections which the coarse pass missed.
+
+Finally the lattice parameter of each phase is refined against all of the peaks that were fitted in the targeted pass at
+once, by a weighted least squares fit of q = sqrt(ratio)*fundamental, which gives both a more precise lattice parameter
+than the coarse pass and an error on it.
+
+As only a handful of windows are fitted in the targeted pass, and the coarse pass has fewer points to scan across, this will
+be a lot quicker than the finder for most patterns. NB: if the coarse pass doesn't find enough peaks for phase_ID.py to
+identify a phase, nothing can be projected, and the coarse results are returned as they are. If this happens a lot, try a
+smaller coarse_factor. The coarse factor is also cut down automatically if the coarse grid would leave too few points in
+each window for the fits to be any better than fitting the noise.
+"""
+
+import numpy as np
+from .finder import fitting, load, scan
+from .instruments import profile, rebin
+from .phase_ID import main
+
+#the fewest points in each window fit, in the coarse scan and at the projected peaks. The Voigt and linear background have 5 free parameters between them,
+#so this leaves a few points over to tell a peak from the noise.
+min_window=8
+
+"""
+the ratios (h^2+k^2+l^2, or the equivalent for the La and HII phases) of the reflections that are projected for each phase.
+The cubic phases use the same reflections as phase_ID.py, the La and HII phases include a further order or two as these
+are quick to check for.
+"""
+reflections={'D':np.array([2,3,4,6,8,9,10,11]),
+             'P':np.array([2,4,6,8,10,12,14]),
+             'G':np.array([6,8,14,16,20,22,24]),
+             'La':np.array([1,4,9,16]),
+             'HII':np.array([1,3,4,7,9])}
+
+"""
+phase_ID.py gives the factors of the La and HII phases as the square root of their ratios (ie. the ratio of q values) and
+the cubic ones as the ratios themselves. _to_ratios and _from_ratios convert between the two.
+"""
+def _to_ratios(key,factors):
+    if key=='La' or key=='HII':
+        return np.round(np.asarray(factors)**2)
+    return np.asarray(factors)
+
+def _from_ratios(key,ratios):
+    if key=='La' or key=='HII':
+        return np.sqrt(ratios)
+    return ratios
+
+"""
+lattice_parameter converts a fundamental (in q) to the lattice parameter of a phase, in the same way as phase_ID.py.
+"""
+def lattice_parameter(key,fundamental):
+    if key=='HII':
+        return (2/np.sqrt(3))*2*np.pi/fundamental
+    return 2*np.pi/fundamental
+
+"""
+targeted fits the data in a window around each of the projected peaks of a phase, and returns which of the projected peaks
+were found, along with the fitted centre and width of each of them. The peaks are fitted in order of increasing q, and the
+fundamental is refined with the peaks found so far after each one, so that the higher order peaks are projected more
+accurately. A fit is only accepted if it is of the peak that was projected: its centre must be within one resolution element
+of the projection, it can't be much narrower than the instrument can resolve, and it can't be a peak that has already been
+indexed as a lower order reflection. The window around each projected peak is narrowed if need be so that it doesn't reach
+the neighbouring projected peaks, which would otherwise pull the fit towards them.
+
+pass the following parameters to this function:
+    x_data, y_data - the q and I(q) values of the data.
+
+    ratios - the ratios of the reflections to fit, in increasing order.
+
+    fundamental - the fundamental (in q) to project the reflections from.
+
+    window_width - the width in q of the window to fit in around each projected peak.
+
+    resolution - the q resolution of the data.
+
+    ht_threshold - the height below which a fitted peak is considered to be noise.
+"""
+def targeted(x_data,y_data,ratios,fundamental,window_width,resolution,ht_threshold):
+    found=np.zeros(len(ratios),dtype=bool)
+    centres=np.zeros(len(ratios))
+    widths=np.zeros(len(ratios))
+
+    for i in range(0,len(ratios)):
+        projected=np.sqrt(ratios)*fundamental
+
+        half_width=window_width/2
+        if len(ratios)>1:
+            half_width=min(half_width,np.min(np.abs(np.delete(projected,i)-projected[i]))/2)
+        in_window=np.where(np.abs(x_data-projected[i])<half_width)[0]
+        if len(in_window)<min_window:
+            continue
+
+        result=fitting(x_data[in_window],y_data[in_window],projected[i],height_threshold=ht_threshold)
+        if result == 0:
+            continue
+        centre,width=result[0],result[1]
+        if np.abs(centre-projected[i])>resolution or width<resolution/4 or np.any(np.abs(centres[found]-centre)<resolution):
+            continue
+
+        found[i]=True
+        centres[i]=centre
+        widths[i]=width
+        fundamental=refine_fundamental(centres[found],ratios[found],widths[found],resolution)[0]
+    return found,centres[found],widths[found]
+
+"""
+refine_fundamental does the joint refinement of a phase: a weighted least squares fit of the peaks to q = sqrt(ratio)*fundamental.
+Each peak is weighted by the inverse square of its fitted width, so that broad, poorly defined peaks count for less. The
+widths are floored at the resolution of the data, so that a fit which has come back unphysically narrow can't swamp the
+rest. It returns the fundamental and its error, which is estimated from the scatter of the peaks about the fit.
+
+pass the following parameters to this function:
+    peaks - the q values of the peaks.
+
+    ratios - the ratios that each of the peaks has been indexed as.
+
+    widths - the fitted widths of the peaks.
+
+    resolution - the q resolution of the data.
+"""
+def refine_fundamental(peaks,ratios,widths,resolution):
+    s=np.sqrt(ratios)
+    weights=1/np.maximum(widths,resolution)**2
+
+    fundamental=np.sum(weights*peaks*s)/np.sum(weights*s**2)
+
+    if len(peaks)>1:
+        residuals=peaks-s*fundamental
+        error=np.sqrt(np.sum(weights*residuals**2)/((len(peaks)-1)*np.sum(weights*s**2)))
+    else:
+        error=np.nan
+    return fundamental,error
+
+"""
+two_pass runs the coarse and targeted passes on a file. It returns a dictionary laid out like the one from phase_ID.py, keyed
+by phase, with values of the lattice parameter, the factors of the peaks, the peaks and (for the refined phases) the error on
+the lattice parameter. As with the finder, the q and I(q) data that was fitted is returned too, or 0 if no peaks were found.
+
+pass the following parameters to this function:
+    file_name, lower_limit, upper_limit, Ganesha, DLS, ht_thresh, instrument - as for the finder.
+
+    coarse_factor - how many times coarser than the resolution of the instrument the grid for the coarse pass is. This is
+                    reduced if it would leave fewer than min_window points in each window.
+
+    targeted_thresh - the height threshold for the fits at the projected peaks. Defaults to a tenth of the threshold used
+                      for the coarse scan.
+
+A phase is only replaced by its refined version if the targeted pass indexed at least as many peaks as the coarse pass did,
+otherwise the coarse assignment is kept as it is. Any coarse peaks which a refined phase didn't find again are added to the
+unassigned peaks (unless another phase has them), so that no peak which was found is lost.
+"""
+def two_pass(file_name,lower_limit,upper_limit,Ganesha=False,DLS=False,ht_thresh=None,instrument=None,coarse_factor=3,targeted_thresh=None):
+
+    pars = profile(instrument,Ganesha=Ganesha,DLS=DLS,ht_threshold=ht_thresh)
+    if pars is None:
+        print('Error! You must tell the programme where the data was collected in order to use the peak finder.')
+        return
+    ht_threshold=pars['ht_threshold']
+    if targeted_thresh is None:
+        targeted_thresh=ht_threshold/10
+
+    x_data,y_data=load(file_name,lower_limit,upper_limit,skip_header=pars['skip_header'],delimiter=pars['delimiter'])
+    x_data,y_data=rebin(x_data,y_data,pars['q_resolution'])
+    step=np.median(np.diff(x_data))
+    #the data can't resolve anything finer than its spacing, whatever the profile says
+    resolution=step
+    if pars['q_resolution'] is not None:
+        resolution=max(step,pars['q_resolution'])
+
+    #coarse pass: find the strong peaks on a decimated pattern, and get a provisional phase from them
+    coarse_factor=max(min(coarse_factor,pars['window_width']/(min_window*step)),1)
+    x_coarse,y_coarse=rebin(x_data,y_data,coarse_factor*step)
+    coarse_step=np.median(np.diff(x_coarse))
+    fitting_range=max(int(round(pars['window_width']/coarse_step)),min_window)
+    coarse_peaks=scan(x_coarse,y_coarse,fitting_range,ht_threshold)
+    if len(coarse_peaks)==0:
+        return 0
+
+    phases=main(coarse_peaks,lower_limit)
+
+    #targeted pass: fit around the projected reflections of each phase found, then refine its lattice parameter
+    refined={}
+    dropped=np.zeros(0)
+    for key in phases.keys():
+        if key not in reflections:
+            continue
+        fundamental=np.mean(phases[key][2]/np.sqrt(_to_ratios(key,phases[key][1])))
+
+        projected=np.sqrt(reflections[key])*fundamental
+        ratios=reflections[key][np.where((projected>lower_limit)&(projected<upper_limit))[0]]
+
+        found,peaks,widths=targeted(x_data,y_data,ratios,fundamental,pars['window_width'],resolution,targeted_thresh)
+        #need at least two peaks to refine, and at least as many as the coarse pass indexed to be an improvement on it
+        if len(peaks)<max(2,len(phases[key][2])):
+            continue
+        ratios=ratios[found]
+
+        #coarse peaks which weren't found again
+        coarse=phases[key][2]
+        dropped=np.append(dropped,coarse[np.all(np.abs(coarse[:,np.newaxis]-peaks)>=coarse_step,axis=1)])
+
+        fundamental,error=refine_fundamental(peaks,ratios,widths,resolution)
+        lp=lattice_parameter(key,fundamental)
+        refined[key]=lp,_from_ratios(key,ratios),peaks,lp*error/fundamental
+
+    phases.update(refined)
+
+    #the unassigned peaks come from the coarse pass, so take out any that have since been indexed, and add the coarse peaks
+    #which the refined phases didn't find again, unless another phase has them
+    if len(refined)>0:
+        unassigned=np.zeros(0)
+        if 'unassigned_peaks' in phases:
+            unassigned=phases.pop('unassigned_peaks')
+        unassigned=np.unique(np.append(unassigned,dropped))
+
+        indexed=np.concatenate([phases[key][2] for key in phases.keys()])
+        unassigned=unassigned[np.all(np.abs(unassigned[:,np.newaxis]-indexed)>=coarse_step,axis=1)]
+        if len(unassigned)>0:
+            phases['unassigned_peaks']=unassigned
+    return phases,x_data,y_data
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Chris Brasnett, University of Bristol, christopher.brasnett@bristol.ac.uk
+
+This programme checks whether two frames of I(q) vs q data are the same to within their noise, so that frames which haven't
+changed (eg. during long equilibration holds or temperature plateaus) can reuse the peaks and phases found in an earlier frame
+instead of going through the peak finder and phase identification again.
+
+Each frame is reduced to a fingerprint: its intensity is normalised by its mean over the q range, and then averaged down onto
+a small number of bins in q, along with an error for each bin. SAXS intensity spans decades across the q range, and so does
+its noise, so the error on each bin is taken from the local noise of the points in it (see local_noise in quality_control.py)
+rather than from a single noise level for the whole frame. The normalisation means that a frame which has just got a bit
+brighter or dimmer (eg. from a change in beam current or exposure) still matches. Two fingerprints are compared with a reduced
+chi-square: if the frames only differ by noise this will be around 1, and it will be much larger if a peak has appeared,
+disappeared or moved. As a change to a single peak only affects one or two bins, which an average over all of the bins
+dilutes, the frames are also said to differ if any one bin is too many errors away from the other frame.
+
+The intended use is to keep the fingerprint of the last frame that was fully analysed, and compare each new frame against
+that. Comparing against the last fully analysed frame, rather than the previous frame, stops a slow drift from being missed
+one small step at a time. See the bluffers_guide_script.py for an example.
+"""
+
+import numpy as np
+from .quality_control import local_noise
+
+"""
+fingerprint returns the normalised, downsampled intensity of a frame and the error on each of its bins, as a tuple.
+
+pass the following parameters to this function:
+    x, y - the q and I(q) values of the frame.
+
+    lower_limit, upper_limit - the q range to make the fingerprint over. Frames that are going to be compared must use the
+                               same range, but don't need to be sampled on the same q values.
+
+    points - the number of bins in the fingerprint. Fewer bins are quicker to compare and less sensitive to noise, but too few
+             will blur neighbouring peaks together.
+"""
+def fingerprint(x,y,lower_limit,upper_limit,points=64):
+    scale=np.mean(y)
+    if scale==0:
+        scale=1
+
+    #the local noise is averaged over about two bins' worth of points
+    width=min(2*(len(y)//points)+1,len(y)-1)
+    width=max(width-(1-width%2),3)
+    sigma=local_noise(y,width)/abs(scale)
+
+    edges=np.linspace(lower_limit,upper_limit,points+1)
+    counts=np.histogram(x,bins=edges)[0]
+    sums=np.histogram(x,bins=edges,weights=y/scale)[0]
+    variances=np.histogram(x,bins=edges,weights=sigma**2)[0]
+
+    #bins with nothing in them are marked as nan, and left out of the comparison
+    with np.errstate(divide='ignore',invalid='ignore'):
+        values=np.where(counts>0,sums/counts,np.nan)
+        errors=np.where(counts>0,np.sqrt(variances)/counts,np.nan)
+    return values,errors
+
+"""
+deviations returns the difference between two fingerprints in each bin that can be compared, in units of the error on the
+difference.
+"""
+def deviations(print_a,print_b):
+    values_a,errors_a=print_a
+    values_b,errors_b=print_b
+
+    variance=errors_a**2+errors_b**2
+    usable=np.isfinite(values_a)&np.isfinite(values_b)&(variance>0)
+    return (values_a[usable]-values_b[usable])/np.sqrt(variance[usable])
+
+"""
+chi_square returns the reduced chi-square between two fingerprints, made with the same q range and number of points.
+"""
+def chi_square(print_a,print_b):
+    z=deviations(print_a,print_b)
+    if len(z)==0:
+        return np.inf
+    return np.mean(z**2)
+
+"""
+similar says whether two fingerprints are the same to within the noise.
+
+pass the following parameters to this function:
+    print_a, print_b - the fingerprints to compare, as returned by fingerprint.
+
+    tolerance - the largest reduced chi-square that two frames can have and still be said to be the same. Values a bit above
+                1 allow for the noise in the data, if frames which have visibly changed are being matched, lower this value.
+
+    max_deviation - the furthest, in errors, that any one bin can be from the other frame for the frames to be said to be the
+                    same. This catches changes to a single peak, which barely move the reduced chi-square.
+"""
+def similar(print_a,print_b,tolerance=1.5,max_deviation=4):
+    z=deviations(print_a,print_b)
+    if len(z)==0:
+        return False
+    return np.mean(z**2)<=tolerance and np.max(np.abs(z))<=max_deviation